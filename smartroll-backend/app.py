@@ -1,23 +1,51 @@
+import logging
 from flask import Flask, jsonify
 from flask_cors import CORS
+from sqlalchemy.engine import make_url
 from config import Config
-from models import db
+from models import db, create_users_table, normalize_student_macs
+from utils.heartbeat_writer import heartbeat_writer
 from routes.auth_routes import auth_bp
 from routes.session_routes import session_bp
-from routes.attendance_routes import attendance_bp
+from routes.attendance_routes import attendance_bp, warm_subnet_cache
 from routes.classroom_routes import classroom_bp
 from routes.login_routes import login_bp
 from routes.signup_routes import signup_bp
 from routes.user_routes import user_bp
 
+def is_memory_sqlite(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == "sqlite" and (
+        url.database in (None, "", ":memory:") or url.query.get("mode") == "memory"
+    )
+
+
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
+    if not is_memory_sqlite(app.config["SQLALCHEMY_DATABASE_URI"]):
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+            **app.config["SQLALCHEMY_ENGINE_OPTIONS"],
+            **app.config["SQLALCHEMY_POOL_SIZE_OPTIONS"],
+        }
+    logging.basicConfig(level=app.config["LOG_LEVEL"])
     CORS(app)
     db.init_app(app)
+    heartbeat_writer.init_app(app)
 
     with app.app_context():
         db.create_all()
+        create_users_table()
+        # create_all() skips tables that already exist, so add any new
+        # indexes to existing databases as well
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(db.engine, checkfirst=True)
+        # Lookups now match the canonical AA:BB:... form exactly, so bring
+        # rows stored in other formats into line
+        normalize_student_macs()
+        # Build the subnet matcher now rather than on the first check-in
+        warm_subnet_cache()
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(session_bp)
@@ -6,5 +6,18 @@ class Config:
     SECRET_KEY = os.getenv("SECRET_KEY", "dev")
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL", "sqlite:///database.db")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+    }
+    # QueuePool sizing; create_app leaves it out for in-memory SQLite,
+    # whose StaticPool rejects these arguments
+    SQLALCHEMY_POOL_SIZE_OPTIONS = {
+        "pool_size": 5,
+        "max_overflow": 10,
+    }
     CLASS_WIFI_SUBNETS = [s.strip() for s in os.getenv("CLASS_WIFI_SUBNETS", "10.").split(",")]
     ADMIN_API_KEY = os.getenv("ADMIN_API_KEY", "smartroll-admin-123")
+    # Off by default: queued heartbeats live only in process memory
+    HEARTBEAT_WRITE_BEHIND = (os.getenv("HEARTBEAT_WRITE_BEHIND") or "false").lower() == "true"
+    LOG_LEVEL = (os.getenv("LOG_LEVEL") or "INFO").strip().upper()
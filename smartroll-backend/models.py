@@ -1,7 +1,48 @@
+import logging
+import sqlite3
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
 from datetime import datetime
+from utils.mac_utils import normalize_mac
 
 db = SQLAlchemy()
+logger = logging.getLogger(__name__)
+
+
+# SQLite tuning, applied to every new pooled connection.
+# WAL lets readers proceed while the heartbeat writer commits.
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.execute("PRAGMA cache_size=-65536")
+    cursor.close()
+
+
+# App accounts (signup/login). Kept outside the ORM metadata so seed.py's
+# drop_all() doesn't wipe registered users; created by create_users_table().
+USERS_TABLE_DDL = text("""
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        first_name TEXT,
+        last_name TEXT,
+        email TEXT UNIQUE,
+        password TEXT
+    )
+""")
+
+
+def create_users_table():
+    """Ensure the users table exists in the app database (call inside an app context)."""
+    db.session.execute(USERS_TABLE_DDL)
+    db.session.commit()
+
 
 # People
 class Instructor(db.Model):
@@ -16,6 +57,44 @@ class Student(db.Model):
     student_id = db.Column(db.String(32), unique=True, index=True)
     mac_address = db.Column(db.String(32), unique=True, index=True)
 
+    # Store one canonical form so lookups are exact matches on the unique index
+    @db.validates("mac_address")
+    def normalize_mac_address(self, key, value):
+        return normalize_mac(value) if value else value
+
+
+def normalize_student_macs():
+    """
+    One-off pass that rewrites stored Student.mac_address values into the
+    canonical form, for rows saved before the validator existed (call inside
+    an app context). Rows whose canonical MAC already belongs to another
+    student are left alone and logged.
+    """
+    rows = db.session.query(Student.id, Student.mac_address).filter(
+        Student.mac_address.isnot(None)
+    ).all()
+    taken = {mac for _, mac in rows}
+
+    changed = 0
+    for student_id, mac in rows:
+        canonical = normalize_mac(mac)
+        if canonical == mac:
+            continue
+        if canonical in taken:
+            logger.warning("Student %s: MAC %r duplicates %r, not normalized",
+                           student_id, mac, canonical)
+            continue
+        db.session.query(Student).filter(Student.id == student_id).update(
+            {Student.mac_address: canonical}, synchronize_session=False
+        )
+        taken.discard(mac)
+        taken.add(canonical)
+        changed += 1
+
+    if changed:
+        db.session.commit()
+        logger.info("Normalized %d stored student MAC addresses", changed)
+
 # Courses & enrollment
 class Course(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -47,6 +126,11 @@ class AttendanceLog(db.Model):
     status = db.Column(db.String(16))  # Present/Late/Left/Absent/Heartbeat
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Latest heartbeat per (session, student) becomes a single index seek
+    __table_args__ = (
+        db.Index("ix_att_sess_stu_ts", session_id, student_id, timestamp.desc()),
+    )
+
 
 #This table stores the IP prefix for each approved classroom network
 class ApprovedSubnet(db.Model):
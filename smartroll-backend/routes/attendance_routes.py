@@ -1,10 +1,74 @@
-from flask import Blueprint, request, jsonify
-from datetime import datetime
+import ipaddress
+import logging
+import time
+from collections import namedtuple
+import orjson
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from datetime import datetime, timedelta
 from models import db, Student, Session, AttendanceLog, ApprovedSubnet
-from sqlalchemy import desc
+from sqlalchemy import and_, desc, func, insert, or_
 from routes.auth_routes import require_admin_key
+from utils.ip_utils import prefix_to_network
+from utils.mac_utils import normalize_mac
+from utils.heartbeat_writer import heartbeat_writer, INSERT_HEARTBEAT
 
 attendance_bp = Blueprint("attendance_bp", __name__, url_prefix="/attendance")
+logger = logging.getLogger(__name__)
+
+# -------------------------
+# Helper — Approved subnet cache
+# -------------------------
+SUBNET_CACHE_TTL = 60  # seconds
+
+# Approved subnets change rarely, so keep the compiled networks in-process
+# instead of querying the table on every check-in
+_subnet_cache = {"networks": {}, "ts": 0.0}
+
+
+def invalidate_subnet_cache():
+    """Force the next subnet check to reload prefixes from the database."""
+    _subnet_cache["ts"] = 0.0
+
+
+def build_network_index(networks) -> dict:
+    """
+    Compiles networks into {ip_version: ((host_bits, {network_int >> host_bits}), ...)}
+    so an address is matched with one set lookup per distinct prefix length.
+    Prefix lengths with the most networks come first.
+    """
+    groups = {}
+    for net in networks:
+        host_bits = net.max_prefixlen - net.prefixlen
+        groups.setdefault(net.version, {}).setdefault(host_bits, set()).add(
+            int(net.network_address) >> host_bits
+        )
+    return {
+        version: tuple(sorted(
+            ((bits, frozenset(nets)) for bits, nets in by_bits.items()),
+            key=lambda item: -len(item[1])
+        ))
+        for version, by_bits in groups.items()
+    }
+
+
+def approved_networks() -> dict:
+    if time.monotonic() - _subnet_cache["ts"] > SUBNET_CACHE_TTL:
+        networks = []
+        for s in ApprovedSubnet.query.all():
+            try:
+                networks.append(prefix_to_network(s.prefix))
+            except ValueError:
+                continue  # skip malformed rows rather than failing every check-in
+        _subnet_cache["networks"] = build_network_index(networks)
+        _subnet_cache["ts"] = time.monotonic()
+    return _subnet_cache["networks"]
+
+
+def warm_subnet_cache():
+    """Load and compile the approved subnets now (call inside an app context)."""
+    invalidate_subnet_cache()
+    approved_networks()
+
 
 # -------------------------
 # Helper — Check if IP is allowed
@@ -13,32 +77,89 @@ def ip_in_approved_subnet(client_ip: str) -> bool:
     if not client_ip:
         return False
 
-    subnets = ApprovedSubnet.query.all()
-    for subnet in subnets:
-        prefix = subnet.prefix.strip()
-        print("DEBUG-Subnet Check: Client IP =", client_ip, "Prefix =", prefix)
-        if client_ip.startswith(prefix):
-            return True
+    try:
+        addr = ipaddress.ip_address(client_ip)
+    except ValueError:
+        return False
+
+    # Integer mask checks instead of string prefix comparisons
+    value = int(addr)
+    return any(
+        value >> host_bits in nets
+        for host_bits, nets in approved_networks().get(addr.version, ())
+    )
+
+
+# -------------------------
+# Helper — Session cache
+# -------------------------
+SESSION_CACHE_TTL = 30  # seconds
+
+# Only the scalar fields the attendance checks need, so cached entries
+# don't hold on to detached ORM instances
+SessionInfo = namedtuple(
+    "SessionInfo", "id start_time end_time heartbeat_minutes grace_minutes"
+)
+
+_session_cache = {}  # session_id -> (SessionInfo, loaded_at)
+
+
+def invalidate_session_cache(session_id=None):
+    """Drop one cached session (or all of them) after it is modified."""
+    if session_id is None:
+        _session_cache.clear()
+    else:
+        _session_cache.pop(session_id, None)
+
+
+def get_session(session_id):
+    """
+    Returns a SessionInfo for the session, or None if it doesn't exist.
+    Results are cached for SESSION_CACHE_TTL seconds so heartbeats don't
+    reload the session on every request.
+
+    The cache is per process. invalidate_session_cache() only clears the
+    worker that calls it, so with several workers (e.g. gunicorn) the others
+    can keep accepting check_in/router_push for an ended session for up to
+    SESSION_CACHE_TTL seconds.
+    """
+    try:
+        session_id = int(session_id)
+    except (TypeError, ValueError):
+        return None
+
+    cached = _session_cache.get(session_id)
+    if cached and time.monotonic() - cached[1] <= SESSION_CACHE_TTL:
+        return cached[0]
+
+    # Column query: no ORM instance or identity-map bookkeeping
+    row = db.session.query(
+        Session.id, Session.start_time, Session.end_time,
+        Session.heartbeat_minutes, Session.grace_minutes
+    ).filter(Session.id == session_id).first()
+    if not row:
+        return None
 
-    return False
+    info = SessionInfo(*row)
+    _session_cache[session_id] = (info, time.monotonic())
+    return info
 
 
 # -------------------------
 # Helper — Check if student is currently checked in
 # -------------------------
-def is_student_checked_in(student_id: int, session_id: int) -> dict:
+def session_is_open(session, now) -> bool:
+    """True if now falls between the session's start and (optional) end."""
+    return now >= session.start_time and not (session.end_time and now > session.end_time)
+
+
+def status_from_last_heartbeat(session, last_ts, now) -> dict:
     """
-    Check if a student is currently checked in to a session.
-    Returns a dict with:
-    - checked_in: bool
-    - reason: str (explanation)
-    - last_heartbeat: str or None (ISO format)
-    - time_until_expiry: int or None (minutes)
+    Compute a student's check-in status from already-loaded values.
+    session is a SessionInfo (or None), last_ts is the timestamp of the
+    student's most recent heartbeat (or None). Returns the same dict as
+    is_student_checked_in without touching the database.
     """
-    now = datetime.utcnow()
-    
-    # Get session
-    session = Session.query.get(session_id)
     if not session:
         return {
             "checked_in": False,
@@ -64,13 +185,7 @@ def is_student_checked_in(student_id: int, session_id: int) -> dict:
             "time_until_expiry": None
         }
     
-    # Get most recent heartbeat for this student in this session
-    last_log = AttendanceLog.query.filter_by(
-        session_id=session_id,
-        student_id=student_id
-    ).order_by(desc(AttendanceLog.timestamp)).first()
-    
-    if not last_log:
+    if not last_ts:
         return {
             "checked_in": False,
             "reason": "no_heartbeat_recorded",
@@ -79,7 +194,7 @@ def is_student_checked_in(student_id: int, session_id: int) -> dict:
         }
     
     # Calculate time since last heartbeat
-    time_since_heartbeat = (now - last_log.timestamp).total_seconds() / 60  # minutes
+    time_since_heartbeat = (now - last_ts).total_seconds() / 60  # minutes
     max_allowed_interval = session.heartbeat_minutes + session.grace_minutes
     
     if time_since_heartbeat <= max_allowed_interval:
@@ -87,18 +202,47 @@ def is_student_checked_in(student_id: int, session_id: int) -> dict:
         return {
             "checked_in": True,
             "reason": "active",
-            "last_heartbeat": last_log.timestamp.isoformat(),
+            "last_heartbeat": last_ts.isoformat(),
             "time_until_expiry": time_until_expiry
         }
     else:
         return {
             "checked_in": False,
             "reason": "heartbeat_expired",
-            "last_heartbeat": last_log.timestamp.isoformat(),
+            "last_heartbeat": last_ts.isoformat(),
             "time_until_expiry": None
         }
 
 
+def is_student_checked_in(student_id: int, session_id: int) -> dict:
+    """
+    Check if a student is currently checked in to a session.
+    Returns a dict with:
+    - checked_in: bool
+    - reason: str (explanation)
+    - last_heartbeat: str or None (ISO format)
+    - time_until_expiry: int or None (minutes)
+    """
+    now = datetime.utcnow()
+    session = get_session(session_id)
+
+    # Most recent heartbeat timestamp only — no need to load the whole row
+    last_ts = None
+    if session and session_is_open(session, now):
+        last_ts = db.session.query(AttendanceLog.timestamp).filter_by(
+            session_id=session_id,
+            student_id=student_id
+        ).order_by(desc(AttendanceLog.timestamp)).limit(1).scalar()
+
+        # A heartbeat still waiting in this process's write-behind queue is
+        # newer (queues in other workers show up only once flushed)
+        pending_ts = heartbeat_writer.pending_timestamp(session.id, student_id)
+        if pending_ts and (not last_ts or pending_ts > last_ts):
+            last_ts = pending_ts
+
+    return status_from_last_heartbeat(session, last_ts, now)
+
+
 # =====================================================
 # 1) STUDENT SELF CHECK-IN
 # =====================================================
@@ -106,36 +250,17 @@ def is_student_checked_in(student_id: int, session_id: int) -> dict:
 def check_in():
     data = request.get_json() or {}
 
-    mac = (data.get("mac") or "").upper()
+    mac = normalize_mac(data.get("mac"))
     session_id = data.get("session_id")
 
-    print("DEBUG-1: Incoming MAC =", mac)
-    print("DEBUG-2: Incoming session_id =", session_id)
+    logger.debug("check_in: mac=%s session_id=%s", mac, session_id)
 
     if not mac or not session_id:
         return jsonify({"error": "missing_fields"}), 400
 
-    # Receive real device IP from Flutter
-    client_ip = data.get("device_ip") or request.remote_addr
-    print("DEBUG-3: Client IP =", client_ip)
-
-    # Subnet validation
-    if not ip_in_approved_subnet(client_ip):
-        print("DEBUG-4: Subnet FAILED")
-        return jsonify({"error": "You must be on classroom Wi-Fi"}), 403
-
-    print("DEBUG-4: Subnet OK")
-
-    # Validate student
-    student = Student.query.filter_by(mac_address=mac).first()
-    print("DEBUG-5: Student =", student)
-
-    if not student:
-        return jsonify({"error": "unknown_device"}), 404
-
-    # Validate session
-    s = Session.query.get(session_id)
-    print("DEBUG-6: Session =", s)
+    # Cheap checks first: the session comes from the cache, so requests
+    # outside the session window are rejected without touching the DB
+    s = get_session(session_id)
 
     if not s:
         return jsonify({"error": "session_not_found"}), 404
@@ -155,30 +280,51 @@ def check_in():
             "session_end_time": s.end_time.isoformat()
         }), 400
 
-    # Create log entry
-    log = AttendanceLog(
-        session_id=session_id,
-        student_id=student.id,
-        mac=mac,
-        status="Heartbeat",
-        timestamp=datetime.utcnow()
-    )
+    # Receive real device IP from Flutter
+    client_ip = data.get("device_ip") or request.remote_addr
 
-    print("DEBUG-7: Log created:", log)
+    # Subnet validation
+    if not ip_in_approved_subnet(client_ip):
+        logger.debug("check_in: %s is not on an approved subnet", client_ip)
+        return jsonify({"error": "You must be on classroom Wi-Fi"}), 403
 
-    # Commit safely
-    try:
-        db.session.add(log)
-        db.session.commit()
-        print("DEBUG-8: Commit OK")
-    except Exception as e:
-        print("DEBUG-8: Commit FAILED:", e)
-        return jsonify({"error": "db_commit_failed"}), 500
+    # Validate student
+    # Only the columns the response needs (row exposes .id and .name)
+    student = db.session.query(Student.id, Student.name).filter(
+        Student.mac_address == mac
+    ).first()
 
-    print("DEBUG-9: Total logs now =", AttendanceLog.query.count())
+    if not student:
+        return jsonify({"error": "unknown_device"}), 404
 
-    # Check current status after recording heartbeat
-    status = is_student_checked_in(student.id, session_id)
+    # Create log entry, stamped with the same instant the window was checked at
+    logged_at = now
+    row = {
+        "session_id": s.id,
+        "student_id": student.id,
+        "mac": mac,
+        "status": "Heartbeat",
+        "timestamp": logged_at
+    }
+
+    # Hand the row to the batched writer; insert it here only if it can't
+    # be queued
+    if not heartbeat_writer.submit(row):
+        # Core INSERT: no ORM unit-of-work; the timestamp is already known
+        stmt = insert(AttendanceLog).values(**row)
+
+        # Commit safely
+        try:
+            db.session.execute(stmt)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logger.exception("check_in: commit failed")
+            return jsonify({"error": "db_commit_failed"}), 500
+
+    # The heartbeat we just recorded is the latest one, so the status can be
+    # computed without reading it back
+    status = status_from_last_heartbeat(s, logged_at, logged_at)
 
     return jsonify({
         "message": "check_in_recorded",
@@ -193,6 +339,10 @@ def check_in():
 # =====================================================
 # 2) ROUTER PUSH ENDPOINT (ADMIN ONLY)
 # =====================================================
+# Routers push far more often than heartbeat_minutes; a student whose last
+# heartbeat is newer than (heartbeat_minutes - slack) is not logged again
+HEARTBEAT_DEDUP_SLACK = timedelta(seconds=30)
+
 @attendance_bp.post("/router_push")
 def router_push():
     if not require_admin_key():
@@ -202,7 +352,7 @@ def router_push():
     session_id = data.get("session_id")
     devices = data.get("connected_devices", [])
 
-    s = Session.query.get(session_id)
+    s = get_session(session_id)
     if not s:
         return jsonify({"error": "session_not_found"}), 404
 
@@ -221,30 +371,63 @@ def router_push():
             "session_end_time": s.end_time.isoformat()
         }), 400
 
-    saved = 0
+    # Resolve every pushed MAC in a single IN query instead of one per device
+    macs = {normalize_mac(dev.get("mac")) for dev in devices}
+    mac_to_id = {
+        m: i for i, m in db.session.query(Student.id, Student.mac_address)
+        .filter(Student.mac_address.in_(macs)).all()
+    } if macs else {}
+
+    # Latest heartbeat per pushed student, so students logged within the
+    # current heartbeat interval aren't written again
+    last_seen = dict(
+        db.session.query(AttendanceLog.student_id, func.max(AttendanceLog.timestamp))
+        .filter(
+            AttendanceLog.session_id == s.id,
+            AttendanceLog.student_id.in_(set(mac_to_id.values()))
+        )
+        .group_by(AttendanceLog.student_id)
+        .all()
+    ) if mac_to_id else {}
+    min_interval = timedelta(minutes=s.heartbeat_minutes) - HEARTBEAT_DEDUP_SLACK
+
+    rows = []
+    skipped = 0
+    written = set()
 
     for dev in devices:
-        mac = (dev.get("mac") or "").upper()
-        student = Student.query.filter_by(mac_address=mac).first()
-        if not student:
+        mac = normalize_mac(dev.get("mac"))
+        student_id = mac_to_id.get(mac)
+        if not student_id or student_id in written:
             continue
 
-        log = AttendanceLog(
-            session_id=session_id,
-            student_id=student.id,
-            mac=mac,
-            status="Heartbeat",
-            timestamp=datetime.utcnow()
+        last_ts = max(
+            filter(None, (last_seen.get(student_id),
+                          heartbeat_writer.pending_timestamp(s.id, student_id))),
+            default=None
         )
+        if last_ts and now - last_ts < min_interval:
+            skipped += 1
+            continue
 
-        db.session.add(log)
-        saved += 1
-
+        written.add(student_id)
+        rows.append({
+            "session_id": s.id,
+            "student_id": student_id,
+            "mac": mac,
+            "status": "Heartbeat",
+            "timestamp": now  # one snapshot instant for the whole push
+        })
+
+    # One executemany of a pre-built INSERT instead of one ORM flush per device
+    if rows:
+        db.session.execute(INSERT_HEARTBEAT, rows)
     db.session.commit()
 
     return jsonify({
         "message": "router_data_ingested",
-        "count": saved
+        "count": len(rows),
+        "skipped_recent": skipped
     }), 200
 
 
@@ -257,14 +440,16 @@ def check_status():
     Check if a student is currently checked in to a session.
     Query params: mac, session_id
     """
-    mac = request.args.get("mac", "").upper()
+    mac = normalize_mac(request.args.get("mac"))
     session_id = request.args.get("session_id", type=int)
 
     if not mac or not session_id:
         return jsonify({"error": "missing_fields"}), 400
 
     # Validate student
-    student = Student.query.filter_by(mac_address=mac).first()
+    student = db.session.query(Student.id, Student.name).filter(
+        Student.mac_address == mac
+    ).first()
     if not student:
         return jsonify({"error": "unknown_device"}), 404
 
@@ -285,17 +470,85 @@ def check_status():
 # =====================================================
 # 4) INSTRUCTOR VIEW LOGS (Newest → Oldest)
 # =====================================================
+MAX_LOG_PAGE_SIZE = 1000
+LOG_STREAM_BATCH = 500
+
+
+def serialize_log_row(row) -> dict:
+    # orjson writes datetimes natively, in the same format as isoformat()
+    _, student_id, mac, status, timestamp = row
+    return {
+        "student_id": student_id,
+        "mac": mac,
+        "status": status,
+        "timestamp": timestamp
+    }
+
+
 @attendance_bp.get("/session/<int:session_id>")
 def session_logs(session_id):
-    logs = AttendanceLog.query.filter_by(
-        session_id=session_id
-    ).order_by(desc(AttendanceLog.timestamp)).all()
-
-    out = [{
-        "student_id": l.student_id,
-        "mac": l.mac,
-        "status": l.status,
-        "timestamp": l.timestamp.isoformat()
-    } for l in logs]
-
-    return jsonify(out), 200
+    """
+    Return a session's logs, newest first.
+    Optional query params:
+    - limit: page size (capped at MAX_LOG_PAGE_SIZE); omit to get every log
+    - cursor: value of the X-Next-Cursor header from the previous page
+
+    X-Next-Cursor is sent whenever a page comes back full, so when the last
+    page holds exactly `limit` rows the next request returns an empty list.
+    Logs with no timestamp can't be placed in the keyset order and only
+    appear in the full (unpaginated) dump.
+    """
+    limit = request.args.get("limit", type=int)
+    cursor = request.args.get("cursor")
+
+    # Select only the serialized columns — no ORM objects are built
+    query = db.session.query(
+        AttendanceLog.id,
+        AttendanceLog.student_id,
+        AttendanceLog.mac,
+        AttendanceLog.status,
+        AttendanceLog.timestamp
+    ).filter(AttendanceLog.session_id == session_id)
+
+    # Keyset pagination on (timestamp, id) so deep pages don't pay for OFFSET
+    if limit or cursor:
+        query = query.filter(AttendanceLog.timestamp.isnot(None))
+
+    if cursor:
+        try:
+            cursor_ts, cursor_id = cursor.rsplit("|", 1)
+            cursor_ts = datetime.fromisoformat(cursor_ts)
+            cursor_id = int(cursor_id)
+        except ValueError:
+            return jsonify({"error": "invalid_cursor"}), 400
+
+        query = query.filter(or_(
+            AttendanceLog.timestamp < cursor_ts,
+            and_(AttendanceLog.timestamp == cursor_ts, AttendanceLog.id < cursor_id)
+        ))
+
+    query = query.order_by(desc(AttendanceLog.timestamp), desc(AttendanceLog.id))
+
+    if not limit:
+        # Full dump: stream rows as they are read so memory stays flat
+        # regardless of how many logs the session has
+        def generate():
+            yield b"["
+            for i, row in enumerate(query.yield_per(LOG_STREAM_BATCH)):
+                yield (b"," if i else b"") + orjson.dumps(serialize_log_row(row))
+            yield b"]"
+
+        return Response(stream_with_context(generate()), mimetype="application/json"), 200
+
+    limit = max(1, min(limit, MAX_LOG_PAGE_SIZE))
+    rows = query.limit(limit).all()
+
+    response = Response(
+        orjson.dumps([serialize_log_row(row) for row in rows]),
+        mimetype="application/json"
+    )
+    if len(rows) == limit:
+        last_id, _, _, _, last_ts = rows[-1]
+        response.headers["X-Next-Cursor"] = f"{last_ts.isoformat()}|{last_id}"
+
+    return response, 200
@@ -2,7 +2,8 @@ from flask import Blueprint, request, jsonify
 from models import db, ApprovedSubnet
 from datetime import datetime
 import os
-from utils.ip_utils import get_ip_prefix
+from utils.ip_utils import get_ip_network, prefix_to_network
+from routes.attendance_routes import invalidate_subnet_cache
 
 # Initialize the blueprint
 classroom_bp = Blueprint("classroom_bp", __name__, url_prefix="/classroom")
@@ -17,13 +18,21 @@ def add_classroom():
     if api_key != os.getenv('ADMIN_API_KEY'):
         return jsonify({"error": "Unauthorized. Invalid or missing API key."}), 403
 
-    # Get the network prefix of the instructor's Wi-Fi
-    prefix = get_ip_prefix()
-
-    # Check if this prefix already exists in database
-    existing = ApprovedSubnet.query.filter_by(prefix=prefix).first()
-    if existing:
-        return jsonify({"message": "This subnet is already registered"}), 200
+    # Get the network (CIDR) of the instructor's Wi-Fi
+    try:
+        prefix = get_ip_network()
+    except ValueError:
+        return jsonify({"error": "Could not determine client network"}), 400
+
+    # Check if this network already exists in database, comparing parsed
+    # networks so legacy dotted rows ("172.23.") match their CIDR form
+    network = prefix_to_network(prefix)
+    for existing in ApprovedSubnet.query.all():
+        try:
+            if prefix_to_network(existing.prefix) == network:
+                return jsonify({"message": "This subnet is already registered"}), 200
+        except ValueError:
+            continue
 
     # Save to the database
     new_classroom = ApprovedSubnet(
@@ -33,6 +42,7 @@ def add_classroom():
     )
     db.session.add(new_classroom)
     db.session.commit()
+    invalidate_subnet_cache()
 
     return jsonify({"message": "Classroom added", "prefix": prefix}), 201
 
@@ -1,31 +1,9 @@
 from flask import Blueprint, request, jsonify
-import sqlite3
-import os
+from sqlalchemy import text
+from models import db
 
 login_bp = Blueprint("login", __name__, url_prefix="/api")
 
-DB_PATH = "instance/database.db"
-
-# Ensure users table exists
-def init_db():
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            first_name TEXT,
-            last_name TEXT,
-            email TEXT UNIQUE,
-            password TEXT
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-# Call once at import
-init_db()
-
 @login_bp.route("/login", methods=["POST"])
 def login():
     data = request.get_json()
@@ -36,14 +14,11 @@ def login():
         return jsonify({"status": "error", "message": "Missing fields"}), 400
 
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT first_name, last_name FROM users WHERE email=? AND password=?",
-            (email, password)
-        )
-        user = cursor.fetchone()
-        conn.close()
+        # Same database as the rest of the app (users table is created in create_app)
+        user = db.session.execute(
+            text("SELECT first_name, last_name FROM users WHERE email=:e AND password=:p"),
+            {"e": email, "p": password}
+        ).first()
 
         if user:
             full_name = f"{user[0]} {user[1]}".strip()
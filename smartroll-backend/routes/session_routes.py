@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from models import db, Course, Session
 from routes.auth_routes import require_admin_key
+from routes.attendance_routes import invalidate_session_cache
 
 session_bp = Blueprint("sessions", __name__, url_prefix="/sessions")
 
@@ -32,4 +33,7 @@ def end_session():
     from datetime import datetime
     s.end_time = datetime.utcnow()
     db.session.commit()
+    # Only this worker's cache; other workers pick up end_time within
+    # SESSION_CACHE_TTL
+    invalidate_session_cache(s.id)
     return jsonify({"message":"session_ended","session_id": s.id})
@@ -1,33 +1,10 @@
 from flask import Blueprint, request, jsonify
-import sqlite3
-import os
+from sqlalchemy import text
+from models import db
 
 # Create a new blueprint for signup
 signup_bp = Blueprint("signup", __name__, url_prefix="/api")
 
-# Database file path
-DB_PATH = "instance/database.db"
-
-# Ensure users table exists
-def init_db():
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            first_name TEXT,
-            last_name TEXT,
-            email TEXT UNIQUE,
-            password TEXT
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-# Initialize the database when this file is imported
-init_db()
-
 
 @signup_bp.route("/signup", methods=["POST"])
 def signup():
@@ -44,36 +21,25 @@ def signup():
         return jsonify({"status": "error", "message": "Missing fields"}), 400
 
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
-        # Ensure the users table exists
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                first_name TEXT,
-                last_name TEXT,
-                email TEXT UNIQUE,
-                password TEXT
-            )
-        ''')
-
         # Check if the email is already registered
-        cursor.execute("SELECT id FROM users WHERE email=?", (email,))
-        if cursor.fetchone():
-            conn.close()
+        existing = db.session.execute(
+            text("SELECT id FROM users WHERE email=:e"), {"e": email}
+        ).first()
+        if existing:
             return jsonify({"status": "error", "message": "Email already exists"}), 409
 
         # Insert the new user
-        cursor.execute(
-            "INSERT INTO users (first_name, last_name, email, password) VALUES (?, ?, ?, ?)",
-            (first_name, last_name, email, password)
+        db.session.execute(
+            text("INSERT INTO users (first_name, last_name, email, password) "
+                 "VALUES (:first_name, :last_name, :email, :password)"),
+            {"first_name": first_name, "last_name": last_name,
+             "email": email, "password": password}
         )
-        conn.commit()
-        conn.close()
+        db.session.commit()
 
         return jsonify({"status": "success", "message": "User registered successfully"}), 200
 
     except Exception as e:
+        db.session.rollback()
         return jsonify({"status": "error", "message": str(e)}), 500
 
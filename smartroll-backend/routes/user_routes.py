@@ -1,9 +1,8 @@
 from flask import Blueprint, request, jsonify
-import sqlite3
-import os
+from sqlalchemy import text
+from models import db
 
 user_bp = Blueprint("user", __name__, url_prefix="/api")
-DB_PATH = "instance/database.db"
 
 @user_bp.route("/user", methods=["GET"])
 def get_user():
@@ -12,17 +11,11 @@ def get_user():
         return jsonify({"status": "error", "message": "Email required"}), 400
 
     try:
-        if not os.path.exists(DB_PATH):
-            return jsonify({"status": "error", "message": "Database not found"}), 500
-
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT first_name, last_name FROM users WHERE email=?",
-            (email,)
-        )
-        user = cursor.fetchone()
-        conn.close()
+        # Use the app's pooled connection instead of opening the DB file per request
+        user = db.session.execute(
+            text("SELECT first_name, last_name FROM users WHERE email=:e"),
+            {"e": email}
+        ).first()
 
         if user:
             name = f"{user[0]} {user[1]}".strip()
@@ -0,0 +1,179 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from sqlalchemy import bindparam, text
+from models import db
+
+logger = logging.getLogger(__name__)
+
+# Compiled once at import; executing it with a list of row dicts runs a
+# single executemany
+INSERT_HEARTBEAT = text(
+    "INSERT INTO attendance_log (session_id, student_id, mac, status, timestamp) "
+    "VALUES (:session_id, :student_id, :mac, :status, :timestamp)"
+).bindparams(bindparam("timestamp", type_=db.DateTime))
+
+RETRY_DELAYS = (0.5, 1.0, 2.0, 4.0)  # seconds between attempts at a failed batch
+
+
+class HeartbeatWriter:
+    """
+    Write-behind buffer for heartbeat logs.
+    Request handlers queue rows with submit() and return immediately; a
+    background thread inserts them in batches (up to batch_size rows, or
+    whatever arrived within flush_interval seconds) with a single commit.
+
+    The queue and pending_timestamp() are per process. With several
+    workers (e.g. gunicorn), a /status request served by another worker
+    won't see a queued heartbeat until it is flushed, up to flush_interval
+    later (longer if the batch is being retried).
+    """
+
+    def __init__(self, app=None, batch_size=500, flush_interval=1.0, maxsize=10_000):
+        self.app = None
+        self.enabled = False
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._pending = {}  # (session_id, student_id) -> newest queued timestamp
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._atexit_registered = False
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get("HEARTBEAT_WRITE_BEHIND", False)
+        self.batch_size = app.config.get("HEARTBEAT_BATCH_SIZE", self.batch_size)
+        self.flush_interval = app.config.get("HEARTBEAT_FLUSH_SECONDS", self.flush_interval)
+        # create_app() may run several times in one process; hook exit once
+        if not self._atexit_registered:
+            atexit.register(self.flush)
+            self._atexit_registered = True
+
+    def submit(self, row: dict) -> bool:
+        """
+        Queue an AttendanceLog row for insertion.
+        Returns False if the row was not queued (write-behind disabled or the
+        queue is full) and the caller must insert it itself.
+        """
+        if not self.enabled:
+            return False
+
+        self._ensure_worker()
+        key = (row["session_id"], row["student_id"])
+        with self._lock:
+            try:
+                self._queue.put_nowait(row)
+            except queue.Full:
+                return False
+            self._pending[key] = row["timestamp"]
+        return True
+
+    def pending_timestamp(self, session_id, student_id):
+        """
+        Newest heartbeat queued for this student in this process that isn't
+        in the DB yet. Other workers' queues are not visible here.
+        """
+        return self._pending.get((session_id, student_id))
+
+    def flush(self):
+        """Stop the worker and write out everything still queued (called at shutdown)."""
+        if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+            try:
+                self._queue.put(None, timeout=5)  # sentinel: write current batch and exit
+            except queue.Full:
+                pass
+            self._thread.join(timeout=10)
+
+        batch = []
+        while True:
+            try:
+                row = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if row is not None:
+                batch.append(row)
+        if batch:
+            self._write(batch)
+
+    def _ensure_worker(self):
+        # The thread doesn't survive a fork (e.g. gunicorn workers), so
+        # start one per process on first use
+        if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name="heartbeat-writer", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            row = self._queue.get()
+            if row is None:
+                return
+            batch = [row]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    row = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if row is None:
+                    self._write(batch)
+                    return
+                batch.append(row)
+            self._write(batch)
+
+    def _write(self, batch):
+        try:
+            # Transient failures (e.g. SQLite "database is locked") get a few
+            # retries with backoff before falling back to row-by-row inserts
+            for delay in RETRY_DELAYS:
+                if self._insert(batch):
+                    return
+                logger.warning("Retrying heartbeat batch (%d rows) in %.1fs", len(batch), delay)
+                time.sleep(delay)
+            if self._insert(batch):
+                return
+
+            lost = [row for row in batch if not self._insert([row])]
+            if lost:
+                logger.error("Dropped %d of %d heartbeat rows after retries: %r",
+                             len(lost), len(batch), lost)
+        finally:
+            self._clear_pending(batch)
+
+    def _insert(self, rows) -> bool:
+        with self.app.app_context():
+            try:
+                db.session.execute(INSERT_HEARTBEAT, rows)
+                db.session.commit()
+                return True
+            except Exception:
+                db.session.rollback()
+                logger.exception("Heartbeat insert failed (%d rows)", len(rows))
+                return False
+
+    def _clear_pending(self, batch):
+        with self._lock:
+            for row in batch:
+                key = (row["session_id"], row["student_id"])
+                if self._pending.get(key) == row["timestamp"]:
+                    del self._pending[key]
+
+
+heartbeat_writer = HeartbeatWriter()
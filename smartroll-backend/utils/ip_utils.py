@@ -1,3 +1,4 @@
+import ipaddress
 from flask import request, current_app
 
 def client_ip():
@@ -24,6 +25,37 @@ def get_ip_prefix():
     return ip
 
 
+def get_ip_network():
+    """
+    Returns the client's network in CIDR form, using the same /16 scope as
+    get_ip_prefix for IPv4 (and /64 for IPv6).
+    Example:
+        192.168.10.24 -> "192.168.0.0/16"
+    Behind a proxy, X-Forwarded-For may list several hops
+    ("1.2.3.4, 10.0.0.1"); the first entry is the original client.
+    Raises ValueError if the client address is not a valid IP.
+    """
+    addr = ipaddress.ip_address(client_ip().split(",")[0].strip())
+    prefixlen = 16 if addr.version == 4 else 64
+    return ipaddress.ip_network(f"{addr}/{prefixlen}", strict=False).with_prefixlen
+
+
+def prefix_to_network(prefix):
+    """
+    Converts a stored subnet prefix into an ipaddress network.
+    Accepts CIDR ("192.168.0.0/16") as well as the legacy dotted
+    prefixes produced by get_ip_prefix ("192.168." -> 192.168.0.0/16).
+    Raises ValueError for anything that is not a valid network.
+    """
+    prefix = prefix.strip()
+    if "/" not in prefix and ":" not in prefix:
+        octets = [o for o in prefix.split(".") if o]
+        if not 0 < len(octets) <= 4:
+            raise ValueError(f"invalid subnet prefix: {prefix!r}")
+        prefix = ".".join(octets + ["0"] * (4 - len(octets))) + f"/{8 * len(octets)}"
+    return ipaddress.ip_network(prefix, strict=False)
+
+
 def on_class_wifi():
     """
     Legacy helper — keeps backward compatibility with earlier logic.
@@ -0,0 +1,19 @@
+import re
+
+_NON_HEX = re.compile(r"[^0-9A-F]")
+
+
+def normalize_mac(mac):
+    """
+    Returns the canonical form used for stored MAC addresses:
+    upper-case, colon-separated pairs.
+    Example:
+        aa-bb-cc-dd-ee-01 -> "AA:BB:CC:DD:EE:01"
+        aabb.ccdd.ee01    -> "AA:BB:CC:DD:EE:01"
+    Values that aren't 12 hex digits are only stripped and upper-cased.
+    """
+    mac = (mac or "").strip().upper()
+    digits = _NON_HEX.sub("", mac)
+    if len(digits) != 12:
+        return mac
+    return ":".join(digits[i:i + 2] for i in range(0, 12, 2))